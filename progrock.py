@@ -31,6 +31,9 @@ _VALUE = 4
 _APP_INCREMENT = 5
 _APP_STEPS = 6
 _RESET_PROC_START = 7
+_SUBTASK = 8
+_SUBTASK_INCREMENT = 9
+_SUBTASK_VALUE = 10
 
 
 class _Interval(threading.Thread):
@@ -76,6 +79,27 @@ class _Process(object):
         self.status = status
         self.steps = float(steps)
         self.value = float(value)
+        self.subtasks = dict()
+        self.subtask_order = list()
+        self.subtask_steps = 0.0
+        self.subtask_value = 0.0
+
+
+class _SubTask(object):
+    """The _SubTask object tracks the progress of a named phase of work
+    within a process. The aggregate of a process's sub-tasks is used as the
+    progress for the process box.
+
+    :param str name: The sub-task name
+    :param int|float steps: The number of steps for the sub-task
+    :param bool app: Roll sub-task increments up into the application bar
+
+    """
+    def __init__(self, name, steps, app):
+        self.name = name
+        self.steps = float(steps)
+        self.value = 0.0
+        self.app = app
 
 
 def increment(ipc_queue, value=1):
@@ -102,6 +126,20 @@ def increment_app(ipc_queue, value=1):
     ipc_queue.put((_APP_INCREMENT, 0, value))
 
 
+def increment_subtask(ipc_queue, name, value=1):
+    """Increment the progress value for a named sub-task of the current
+    process, passing in the queue exposed by ``MultiProgress.ipc_queue``. The
+    sub-task must have been opened with :py:meth:`progrock.subtask`, updates
+    for sub-task names that have not been opened are ignored.
+
+    :param multiprocessing.Queue ipc_queue: The IPC command queue
+    :param str name: The sub-task name
+    :param int value: The value to increment by. Default: ``1``
+
+    """
+    ipc_queue.put((_SUBTASK_INCREMENT, os.getpid(), (name, value)))
+
+
 def reset_start_time(ipc_queue):
     """Restart the start time of a process, passing in the queue
     exposed by ``MultiProgress.ipc_queue`` and automatically passed into
@@ -163,6 +201,20 @@ def set_step_count(ipc_queue, steps):
     ipc_queue.put((_STEPS, os.getpid(), steps))
 
 
+def set_subtask_value(ipc_queue, name, value):
+    """Set the progress value for a named sub-task of the current process,
+    passing in the queue exposed by ``MultiProgress.ipc_queue``. The sub-task
+    must have been opened with :py:meth:`progrock.subtask`, updates for
+    sub-task names that have not been opened are ignored.
+
+    :param multiprocessing.Queue ipc_queue: The IPC command queue
+    :param str name: The sub-task name
+    :param int value: The value to set for the sub-task
+
+    """
+    ipc_queue.put((_SUBTASK_VALUE, os.getpid(), (name, value)))
+
+
 def set_value(ipc_queue, value):
     """Set the progress value for the current process, passing in the queue
     exposed by ``MultiProgress.ipc_queue`` and automatically passed into
@@ -176,6 +228,32 @@ def set_value(ipc_queue, value):
     ipc_queue.put((_VALUE, os.getpid(), value))
 
 
+def subtask(ipc_queue, name, steps=100, app=False):
+    """Open a named sub-task for the current process, passing in the queue
+    exposed by ``MultiProgress.ipc_queue`` and automatically passed into
+    the target function when creating the process with
+    :py:class:`MultiProgress.new_process`.
+
+    Once a process has opened a sub-task, its progress bar displays the
+    combined progress of all of its sub-tasks instead of the value set with
+    :py:meth:`progrock.increment`. Opening a sub-task with a name that is
+    already in use resets it with the new step count. Each sub-task counts
+    towards the process progress bar in proportion to its ``steps``, so open
+    all of the sub-tasks for a process up front to keep its progress bar
+    from moving backwards when a later sub-task is opened. If ``app`` is
+    ``True``, changes to the sub-task value are also applied to the
+    application progress bar, and resetting the sub-task removes its
+    progress from the application progress bar.
+
+    :param multiprocessing.Queue ipc_queue: The IPC command queue
+    :param str name: The sub-task name
+    :param int steps: The number of steps for the sub-task. Default: ``100``
+    :param bool app: Roll increments up into the application progress bar
+
+    """
+    ipc_queue.put((_SUBTASK, os.getpid(), (name, steps, app)))
+
+
 class MultiProgress(object):
     """The MultiProgress class is responsible for rendering the progress screen
     using curses. In addition, it can wrap the creation of processes for you
@@ -191,9 +269,14 @@ class MultiProgress(object):
     if you're incrementing from a child process, you can call
     :py:meth:`progrock.increment_app` passing in ``ipc_queue``.
 
+    Processes may open named sub-tasks using :py:meth:`progrock.subtask`. If
+    ``expand_subtasks`` is ``True``, each process box is expanded to display a
+    progress bar per sub-task. Pressing ``e`` toggles the expanded display.
+
     :param str title: The application title
     :param int steps: Overall steps for the application
     :param int value: Overall progress value for the application
+    :param bool expand_subtasks: Display a progress bar for each sub-task
 
     """
     BOX_HEIGHT = 4
@@ -205,15 +288,21 @@ class MultiProgress(object):
     DEFAULT_STEPS = 100
     DEFAULT_STATUS = 'Initializing'
 
-    def __init__(self, title=None, steps=None, value=0):
+    SUBTASK_NAME_WIDTH = 10
+
+    def __init__(self, title=None, steps=None, value=0,
+                 expand_subtasks=False):
         locale.setlocale(locale.LC_ALL, '')
         self.ipc_queue = multiprocessing.Queue()
         self._canvas = None
         self._code = locale.getpreferredencoding()
         self._footer = None
+        self._expand_subtasks = expand_subtasks
         self._header = None
         self._canvas_offset = 0
+        self._layout_lock = threading.RLock()
         self._lock = threading.Lock()
+        self._pids = list()
         self._process = dict()
         self._screen = None
         self._start = None
@@ -273,20 +362,12 @@ class MultiProgress(object):
         :param int|float value: Current progress value for the process
 
         """
-        start_y = int(math.floor(self._process_count / 2) * self.BOX_HEIGHT)
-        start_x = (self._process_count % 2) * self._box_width
-        self._maybe_resize_canvas(start_y)
-
-        try:
-            window = self._canvas.subwin(self.BOX_HEIGHT, self._box_width,
-                                         start_y, start_x)
-        except curses.error as error:
-            raise ValueError('Error creating window for pid %s (%i,%i): %s' %
-                             (process.pid, start_y, start_x, error))
-
-        self._process[process.pid] = _Process(process, window, status,
-                                              steps, value)
-        self._draw_box(process.pid)
+        with self._layout_lock:
+            window = self._new_box_window(process.pid, self._process_count)
+            self._pids.append(process.pid)
+            self._process[process.pid] = _Process(process, window, status,
+                                                  steps, value)
+            self._draw_box(process.pid)
         self._draw_footer()
 
     def increment_app(self, value=1):
@@ -298,8 +379,10 @@ class MultiProgress(object):
         """
         with self._lock:
             self._value += float(value)
-            if self._value > self._steps:
+            if self._steps is not None and self._value > self._steps:
                 self._value = self._steps
+            elif self._value < 0:
+                self._value = 0.0
         if self._steps:
             self._update_footer_progress()
 
@@ -335,10 +418,13 @@ class MultiProgress(object):
     # Internal Methods
 
     def _box_progress(self, process):
-        if not process.steps:
+        if process.subtasks:
+            steps, value = process.subtask_steps, process.subtask_value
+        else:
+            steps, value = process.steps, process.value
+        if not steps:
             return self._progress_bar(0, self._progress_bar_width)
-        return self._progress_bar((process.value / process.steps),
-                                  self._progress_bar_width)
+        return self._progress_bar((value / steps), self._progress_bar_width)
 
     def _box_status(self, process):
         duration = time.time() - process.start
@@ -359,6 +445,9 @@ class MultiProgress(object):
         window.border()
         window.addstr(1, 2, self._box_status(self._process[pid]))
         window.addstr(2, 2, self._box_progress(self._process[pid]))
+        if self._expand_subtasks:
+            for name in self._process[pid].subtask_order:
+                self._update_subtask_progress(self._process[pid], name)
 
     def _draw_footer(self):
         self._footer.erase()
@@ -376,6 +465,18 @@ class MultiProgress(object):
         self._header.refresh()
         self._update_header_time()
 
+    def _increment_subtask(self, process, name, value):
+        with self._layout_lock:
+            if name not in process.subtasks:
+                return
+            subtask = process.subtasks[name]
+            with self._lock:
+                previous = subtask.value
+                subtask.value = max(0.0, min(subtask.value + float(value),
+                                             subtask.steps))
+                process.subtask_value += subtask.value - previous
+            self._on_subtask_value_change(process, subtask, previous)
+
     def _increment_value(self, process, value):
         with self._lock:
             process.value += float(value)
@@ -417,16 +518,42 @@ class MultiProgress(object):
                 if self._canvas_offset <= 0:
                     self._canvas_offset = 0
                     curses.beep()
+            elif cmd == 101:
+                with self._layout_lock:
+                    self._expand_subtasks = not self._expand_subtasks
+                    self._layout_boxes()
             else:
                 continue
             self._refresh_canvas()
 
+    def _layout_boxes(self):
+        rows = int(math.ceil(self._process_count / 2.0))
+        height = max(rows * self._box_height, self._canvas_height)
+        self._canvas.resize(height, self._screen_width)
+        self._canvas.erase()
+        for index, pid in enumerate(self._pids):
+            self._process[pid].window = self._new_box_window(pid, index)
+            self._draw_box(pid)
+        max_offset = max(self._canvas_vheight - self._canvas_height, 0)
+        self._canvas_offset = min(self._canvas_offset, max_offset)
+
     def _maybe_resize_canvas(self, start_y):
         canvas_height, _width = self._canvas.getmaxyx()
-        if (start_y + self.BOX_HEIGHT) > canvas_height:
-            new_height = canvas_height + self.BOX_HEIGHT
+        if (start_y + self._box_height) > canvas_height:
+            new_height = start_y + self._box_height
             self._canvas.resize(new_height, self._screen_width)
 
+    def _new_box_window(self, pid, index):
+        start_y = int(math.floor(index / 2) * self._box_height)
+        start_x = (index % 2) * self._box_width
+        self._maybe_resize_canvas(start_y)
+        try:
+            return self._canvas.subwin(self._box_height, self._box_width,
+                                       start_y, start_x)
+        except curses.error as error:
+            raise ValueError('Error creating window for pid %s (%i,%i): %s' %
+                             (pid, start_y, start_x, error))
+
     def _on_screen_update_interval(self):
         self._update_footer_time()
         if self._steps:
@@ -436,6 +563,34 @@ class MultiProgress(object):
         self._refresh_canvas()
         self._screen.refresh()
 
+    def _on_subtask_value_change(self, process, subtask, previous):
+        if subtask.app and self._steps:
+            self.increment_app(subtask.value - previous)
+        self._update_box_progress(process)
+        if self._expand_subtasks:
+            self._update_subtask_progress(process, subtask.name)
+
+    def _open_subtask(self, process, name, steps, app):
+        with self._layout_lock:
+            previous = process.subtasks.get(name)
+            with self._lock:
+                if previous:
+                    process.subtask_steps -= previous.steps
+                    process.subtask_value -= previous.value
+                else:
+                    process.subtask_order.append(name)
+                process.subtasks[name] = _SubTask(name, steps, app)
+                process.subtask_steps += float(steps)
+            if previous and previous.app and self._steps:
+                self.increment_app(-previous.value)
+            height, _width = process.window.getmaxyx()
+            if self._expand_subtasks and self._box_height > height:
+                self._layout_boxes()
+            else:
+                self._update_box_progress(process)
+                if self._expand_subtasks:
+                    self._update_subtask_progress(process, name)
+
     def _process_update_command(self, cmd, pid, value):
         if cmd == _INCREMENT:
             self._increment_value(self._process[pid], value)
@@ -451,6 +606,12 @@ class MultiProgress(object):
             self._set_app_steps(value)
         elif cmd == _RESET_PROC_START:
             self._reset_process_start(self._process[pid])
+        elif cmd == _SUBTASK:
+            self._open_subtask(self._process[pid], *value)
+        elif cmd == _SUBTASK_INCREMENT:
+            self._increment_subtask(self._process[pid], *value)
+        elif cmd == _SUBTASK_VALUE:
+            self._set_subtask_value(self._process[pid], *value)
 
     @staticmethod
     def _progress_bar(percentage, bar_width):
@@ -467,13 +628,14 @@ class MultiProgress(object):
                                                                    empty=empty)
 
     def _refresh_canvas(self):
-        try:
-            self._canvas.refresh(self._canvas_offset, 0,
-                                 self.HEADER_HEIGHT, 0,
-                                 self._canvas_height,
-                                 self._screen_width)
-        except curses.error:
-            pass
+        with self._layout_lock:
+            try:
+                self._canvas.refresh(self._canvas_offset, 0,
+                                     self.HEADER_HEIGHT, 0,
+                                     self._canvas_height,
+                                     self._screen_width)
+            except curses.error:
+                pass
 
     def _reset_process_start(self, process):
         with self._lock:
@@ -496,20 +658,50 @@ class MultiProgress(object):
             process.steps = float(value)
         self._update_box_progress(process)
 
+    def _set_subtask_value(self, process, name, value):
+        with self._layout_lock:
+            if name not in process.subtasks:
+                return
+            subtask = process.subtasks[name]
+            with self._lock:
+                previous = subtask.value
+                subtask.value = max(0.0, min(float(value), subtask.steps))
+                process.subtask_value += subtask.value - previous
+            self._on_subtask_value_change(process, subtask, previous)
+
     def _set_value(self, process, value):
         with self._lock:
             process.value = float(value)
         self._update_box_progress(process)
 
     def _update_box_progress(self, process):
-        process.window.addstr(2, 2, self._box_progress(process))
+        with self._layout_lock:
+            process.window.addstr(2, 2, self._box_progress(process))
 
     def _update_box_status(self, process):
-        process.window.addstr(1, 2, self._box_status(process))
+        with self._layout_lock:
+            process.window.addstr(1, 2, self._box_status(process))
 
     def _update_box_timers(self):
-        for pid in self._process:
-            self._update_box_status(self._process[pid])
+        with self._layout_lock:
+            for pid in self._process:
+                self._update_box_status(self._process[pid])
+
+    def _update_subtask_progress(self, process, name):
+        subtask = process.subtasks[name]
+        width = self._progress_bar_width - self.SUBTASK_NAME_WIDTH - 1
+        if not subtask.steps:
+            value = self._progress_bar(0, width)
+        else:
+            value = self._progress_bar(subtask.value / subtask.steps, width)
+        row = 3 + process.subtask_order.index(name)
+        height, _width = process.window.getmaxyx()
+        if row >= height - 1:
+            return
+        process.window.addstr(row, 2,
+                              '{0: <{width}} {1}'.format(
+                                  name[0:self.SUBTASK_NAME_WIDTH], value,
+                                  width=self.SUBTASK_NAME_WIDTH))
 
     def _update_footer_progress(self):
         if not self._steps:
@@ -541,6 +733,12 @@ class MultiProgress(object):
                 continue
             self._process_update_command(cmd, pid, value)
 
+    @property
+    def _box_height(self):
+        if not self._expand_subtasks:
+            return self.BOX_HEIGHT
+        return self.BOX_HEIGHT + self._max_subtasks
+
     @property
     def _box_width(self):
         return int(self._screen_width / 2)
@@ -554,6 +752,11 @@ class MultiProgress(object):
         height, _width = self._canvas.getmaxyx()
         return height
 
+    @property
+    def _max_subtasks(self):
+        return max([len(self._process[pid].subtask_order)
+                    for pid in self._process] or [0])
+
     @property
     def _process_count(self):
         return len(self._process)